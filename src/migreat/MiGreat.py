@@ -1,21 +1,18 @@
+# Heavy third party dependencies (sqlalchemy, yaml) are imported lazily inside the
+# functions that need them, so operations like init and --help don't pay their import
+# cost.  Keep the top-level import surface to the cheap standard library modules.
 import argparse
-from glob import glob
+import dataclasses
 import importlib
-import hashlib
+import json
 import logging
 import os
-from typing import Optional
-from pydantic import BaseModel
-import re
-from sqlalchemy import create_engine, text
-import sqlalchemy
-from sqlalchemy import exc
-from sqlalchemy.exc import OperationalError
-from sqlalchemy.orm import Session
+from typing import Optional, get_args
 import sys
 import random
+import stat
 import time
-import yaml
+import zlib
 
 LOG_LEVEL = os.getenv("MIGREAT_LOG_LEVEL", "info")
 
@@ -37,20 +34,35 @@ ch.setFormatter(logging.Formatter("%(levelname)s: %(asctime)s - %(message)s"))
 logger.addHandler(ch)
 
 
-class Config(BaseModel):
+_migrator_template = None
+
+def _get_migrator_template() -> str:
+    """
+        Reads and caches the migrator template, resolved through importlib.resources so it
+        also works when the package is installed as a zipped wheel.
+    """
+    global _migrator_template
+    if _migrator_template is None:
+        from importlib.resources import files
+
+        _migrator_template = files("migreat").joinpath("templates/migrator.tmpl").read_text()
+    return _migrator_template
+
+
+@dataclasses.dataclass(slots=True, frozen=True)
+class Config:
     """
         Config file schema
     """
     hostname: str
-    port: int = 5432
     database: str
     priv_db_username: str
     priv_db_password: str
     service_db_username: str
     service_db_password: str
     service_schema: str
-    group: Optional[str]
-    legacy_sqlalchemy: bool = False
+    port: int = 5432
+    group: Optional[str] = None
     max_conn_retries: int = 10
     conn_retry_interval: int = 5
     migration_table: str = "migrate_version"
@@ -61,6 +73,44 @@ class Config(BaseModel):
     # will automatically change db password when a login fails for a given non-privileged user
     sync_failed_passwords: Optional[bool] = False
 
+    @classmethod
+    def from_dict(cls, raw: dict) -> "Config":
+        """
+            Builds a Config from the parsed yaml dict in a single pass over the fields:
+            ${VAR} values are substituted from the environment, and string values are
+            coerced to their declared field types.
+        """
+        kwargs = {}
+        for name, field_type in _CONFIG_FIELDS.items():
+            if name not in raw:
+                continue
+            value = raw[name]
+            # The substitution pattern is anchored and simple, so a pair of string checks
+            # replaces a regex entirely and short-circuits non-strings
+            if isinstance(value, str) and value.startswith("${") and value.endswith("}"):
+                value = os.environ.get(value[2:-1], "")
+            if isinstance(value, str) and field_type is not str:
+                if field_type is bool:
+                    value = value.strip().lower() in ("1", "true", "yes", "on")
+                else:
+                    value = field_type(value)
+            kwargs[name] = value
+        return cls(**kwargs)
+
+
+def _concrete_type(annotation):
+    """
+        Unwraps Optional[...] annotations to their concrete type.
+    """
+    args = [arg for arg in get_args(annotation) if arg is not type(None)]
+    return args[0] if args else annotation
+
+
+_CONFIG_FIELDS = {
+    field.name: _concrete_type(field.type) for field in dataclasses.fields(Config)
+}
+""" Field name to concrete type, resolved once for config coercion """
+
 
 class MiGreat:
     """
@@ -88,6 +138,15 @@ class MiGreat:
     )
     """ MiGreat configuration file """
 
+    CONFIG_CACHE_FILE = CONFIG_FILE + ".cache.json"
+    """ JSON cache of the parsed configuration file """
+
+    CONFIG_CACHE_VERSION = 1
+    """ Cache schema version, bump to invalidate stale caches """
+
+    MAX_RETRY_DELAY = 60
+    """ Upper bound (seconds) on any single backoff sleep """
+
     TEMPLATES_DIR = os.path.abspath(
         os.path.join(
             os.path.dirname(__file__),
@@ -135,7 +194,7 @@ class MiGreat:
             try:
                 os.mkdir(MiGreat.SCRIPTS_DIR)
             except FileExistsError:
-                logger.error(f"The directory {MiGreat.SCRIPTS_DIR} already exists")
+                logger.error("The directory %s already exists", MiGreat.SCRIPTS_DIR)
                 sys.exit(1)
 
             with open(os.path.join(MiGreat.TEMPLATES_DIR, "MiGreat.yaml"), "rt") as config_file:
@@ -155,27 +214,20 @@ class MiGreat:
 
             config = mg.config
             if config.use_advisory_lock:
-                priv_engine = MiGreat.connect(
-                    config.hostname,
-                    config.port,
-                    config.database,
-                    config.priv_db_username,
-                    config.priv_db_password,
-                    config.conn_retry_interval,
-                    config.max_conn_retries,
-                    False,
-                    False,
-                )
+                from sqlalchemy import text
+
+                # Reuse the same engine the upgrade itself will run on
+                priv_engine = mg.__get_priv_engine()
 
-                sha_start = hashlib.sha256(config.service_schema.encode('utf8')).digest()[:4]
-                lock_id = int.from_bytes(sha_start, 'little')
+                # A non-cryptographic 32 bit hash is plenty for a deterministic lock key
+                lock_id = zlib.crc32(config.service_schema.encode('utf8'))
                 with priv_engine.connect() as lock_conn:
                     logger.info("Waiting for advisory lock")
                     # Block until lock is available.  This allows init container to wait on all replicas
                     # until the migration is complete.
                     lock_conn.execute(text(f"SELECT pg_advisory_lock({lock_id})"))
                     logger.info("Lock acquired")
-                    mg.upgrade()
+                    mg.upgrade(lock_conn=lock_conn)
                     logger.info("Releasing lock")
             else:
                 mg.upgrade()
@@ -193,22 +245,66 @@ class MiGreat:
             logger.error("Couldn't find MiGreat scripts directory.  Try initializing the space first.")
             sys.exit(1)
 
-        with open(MiGreat.CONFIG_FILE) as config_file:
-            the_yaml = yaml.safe_load(config_file)
-            annotations = Config.__annotations__
-            for key, value in the_yaml.items():
-                match = MiGreat.__VAR_SUBST_MATCHER.match(str(value))
-                if match is not None:
-                    var_name = match.groups()[0]
-                    var = os.environ.get(var_name, "")
-                    if key in annotations:
-                        # Convert to the proper type since all environment variables are strings
-                        the_yaml[key] = annotations[key](var)
-
-            config = Config(**the_yaml)
+        # Environment variable substitution and type coercion both happen inside from_dict
+        config = Config.from_dict(MiGreat.__load_config_dict())
 
         return MiGreat(config)
 
+    @staticmethod
+    def __load_config_dict() -> dict:
+        """
+            Returns the parsed configuration file as a dictionary, maintaining a JSON cache
+            beside the yaml file so warm starts skip the yaml parse entirely.  Environment
+            variable substitution is deliberately not cached, so rotated secrets take effect
+            without touching the config file.
+        """
+        config_mtime = os.path.getmtime(MiGreat.CONFIG_FILE)
+        try:
+            if os.path.getmtime(MiGreat.CONFIG_CACHE_FILE) >= config_mtime:
+                with open(MiGreat.CONFIG_CACHE_FILE) as cache_file:
+                    cached = json.load(cache_file)
+                if cached.get("cache_version") == MiGreat.CONFIG_CACHE_VERSION:
+                    return cached["config"]
+        except (OSError, ValueError, KeyError):
+            # Missing or corrupt cache, fall through to the yaml parse
+            pass
+
+        import yaml
+        try:
+            # libyaml bindings parse in C and are considerably faster than the pure-python loader
+            from yaml import CSafeLoader as yaml_loader
+        except ImportError:
+            from yaml import SafeLoader as yaml_loader
+
+        with open(MiGreat.CONFIG_FILE, "rb") as config_file:
+            the_yaml = yaml.load(config_file, Loader=yaml_loader)
+
+        try:
+            # The cache can contain anything the yaml does (including literal credentials),
+            # so it inherits the config file's permissions rather than the default umask
+            config_mode = stat.S_IMODE(os.stat(MiGreat.CONFIG_FILE).st_mode)
+            fd = os.open(
+                MiGreat.CONFIG_CACHE_FILE,
+                os.O_WRONLY | os.O_CREAT | os.O_TRUNC,
+                config_mode,
+            )
+            with os.fdopen(fd, "wt") as cache_file:
+                json.dump({
+                    "cache_version": MiGreat.CONFIG_CACHE_VERSION,
+                    "config": the_yaml,
+                }, cache_file)
+            # os.open's mode is masked by the umask and ignored for pre-existing files
+            os.chmod(MiGreat.CONFIG_CACHE_FILE, config_mode)
+        except (OSError, TypeError, ValueError):
+            # A read-only config directory, or yaml values json can't represent (dates,
+            # binary, ...), just means no warm start cache; the parse still succeeded
+            try:
+                os.remove(MiGreat.CONFIG_CACHE_FILE)
+            except OSError:
+                pass
+
+        return the_yaml
+
     @staticmethod
     def connect(
         hostname,
@@ -218,45 +314,72 @@ class MiGreat:
         password,
         retry_interval,
         max_retries,
-        legacy_sqlalchemy,
         raise_on_failure: bool,
     ):
         """
             Returns a connection to the target database.
         """
-        logger.debug(f"Connecting to: postgresql://{username}:<password>@{hostname}:{port}/{database}")
+        from sqlalchemy import create_engine
+        from sqlalchemy.exc import OperationalError
+
+        logger.debug("Connecting to: postgresql://%s:<password>@%s:%s/%s", username, hostname, port, database)
         engine = create_engine(
             f"postgresql://{username}:{password}@{hostname}:{port}/{database}",
-            future=not legacy_sqlalchemy,
+            # Liveness is verified on checkout by the pool, so no explicit SELECT 1 probe
+            pool_pre_ping=True,
+            # Recycle pooled connections hourly so long migrations don't trip idle timeouts
+            pool_recycle=3600,
+            # Batch executemany calls server-side so bulk inserts issued by migrator
+            # scripts ship pages of rows per round-trip instead of one each
+            executemany_mode="values_plus_batch",
+            insertmanyvalues_page_size=1000,
         )
 
-        # Attempt to connect, and retry on failure
+        # Attempt to connect, and retry on failure.  Backoff is exponential with full jitter
+        # so parallel replicas booting together don't synchronize their reconnect attempts.
         last_err = None
-        for _ in range(max_retries+1):
+        for attempt in range(max_retries+1):
             try:
-                with engine.connect() as conn:
-                    conn.execute(text("SELECT 1"))
-                    break
+                engine.connect().close()
+                break
             except OperationalError as e:
                 last_err = e
-                logger.info(f"Connection failed, waiting {retry_interval}s before retrying")
-                logger.debug(f"Error code: {e.code}")
+                delay = random.uniform(0, min(MiGreat.MAX_RETRY_DELAY, retry_interval * (2 ** attempt)))
+                logger.info("Connection failed, waiting %.1fs before retrying", delay)
+                logger.debug("Error code: %s", e.code)
                 logger.debug(e)
-                time.sleep(retry_interval)
+                time.sleep(delay)
         else:
-            logger.error(f"Unable to establish connection after {max_retries+1} attempts")
+            logger.error("Unable to establish connection after %s attempts", max_retries+1)
             if raise_on_failure:
                 raise last_err
             sys.exit(1)
 
         return engine
 
+    @staticmethod
+    def streaming_session(engine):
+        """
+            Returns a session whose statements stream through a server-side cursor in
+            batches of 1000 rows rather than buffering entire result sets client-side.
+            Intended for migrators that walk large tables.
+        """
+        from sqlalchemy.orm import Session
+
+        return Session(
+            engine.execution_options(stream_results=True, yield_per=1000)
+        )
+
     def __init__(self, config: Config):
         """
             Initializes an instance of MiGreat.
         """
-        logger.info(f"MiGreat")
+        logger.info("MiGreat")
         self.__config = config
+        self.__priv_engine = None
+        self.__service_engine = None
+        self.__migrator_scripts = None
+        self.__version_queries = None
 
     @property
     def config(self) -> Config:
@@ -265,6 +388,55 @@ class MiGreat:
         """
         return self.__config
 
+    def __get_version_queries(self):
+        """
+            Lazily builds the version SELECT/UPDATE statements once per instance.  The
+            schema and table names are interpolated a single time, so SQLAlchemy's
+            compiled-statement cache keys on stable objects instead of missing on every
+            freshly-built string.
+        """
+        if self.__version_queries is None:
+            from sqlalchemy import text
+
+            config = self.__config
+            # These are fully qualified in case the privileged user has been selected to
+            # perform the operation.
+            sel_version = f"SELECT version FROM \"{config.service_schema}\".\"{config.migration_table}\""
+            upd_version = f"""
+                UPDATE \"{config.service_schema}\".\"{config.migration_table}\"
+                SET version = :next_version
+                RETURNING version
+            """
+            self.__version_queries = (text(sel_version), text(upd_version))
+        return self.__version_queries
+
+    def __get_priv_engine(self):
+        """
+            Lazily connects the privileged engine, reusing it for the remainder of the run.
+            Engines own a connection pool and are expensive to build, so one per user is plenty.
+        """
+        config = self.__config
+        if self.__priv_engine is None:
+            self.__priv_engine = MiGreat.connect(
+                config.hostname,
+                config.port,
+                config.database,
+                config.priv_db_username,
+                config.priv_db_password,
+                config.conn_retry_interval,
+                config.max_conn_retries,
+                False,
+            )
+        return self.__priv_engine
+
+    def __get_service_engine(self):
+        """
+            Lazily connects the service user engine, reusing it for the remainder of the run.
+        """
+        if self.__service_engine is None:
+            self.__service_engine = self.__connect_service_user(self.__get_priv_engine())
+        return self.__service_engine
+
     def create(self):
         """
             Creates a new migration script from the template.
@@ -272,43 +444,35 @@ class MiGreat:
         highest_version, _ = self.__validate_migrator_scripts()
         next_version = highest_version + 1
         migrator = f"{str(next_version).zfill(4)}_unnamed_migrator.py"
-        with open(os.path.join(MiGreat.TEMPLATES_DIR, "migrator.tmpl"), "rt") as m_tmpl:
-            template = m_tmpl.read()
         with open(os.path.join(MiGreat.SCRIPTS_DIR, migrator), "wt") as m_script:
-            m_script.write(template)
-        logger.info(f"Wrote new migrator {migrator}")
+            m_script.write(_get_migrator_template())
+        # The directory contents changed, so the cached scan is stale
+        self.__migrator_scripts = None
+        logger.info("Wrote new migrator %s", migrator)
 
-    def upgrade(self):
+    def upgrade(self, lock_conn=None):
         """
             Runs migrators in order, starting with the next version.  Each migrator is
             independently transacted.  Migrations are always executed by the service user.
+            When lock_conn holds the advisory lock, Postgres already serializes replicas,
+            so the sleep/retry contention handling is skipped.
         """
+        from sqlalchemy import text
+        from sqlalchemy.orm import Session
+
         config = self.config
+        locked = lock_conn is not None
         if config.dead is True:
             # Ensure all elements are deleted and then exit
-            self.__check_and_remove_migraton_controls()
+            self.__check_and_remove_migraton_controls(locked=locked)
             return
-        self.__check_and_apply_migration_controls()
+        self.__check_and_apply_migration_controls(locked=locked)
         highest_version, scripts = self.__validate_migrator_scripts()
 
-        priv_engine = MiGreat.connect(
-            config.hostname,
-            config.port,
-            config.database,
-            config.priv_db_username,
-            config.priv_db_password,
-            config.conn_retry_interval,
-            config.max_conn_retries,
-            config.legacy_sqlalchemy,
-            False,
-        )
-
-        service_engine = self.__connect_service_user(priv_engine)
+        priv_engine = self.__get_priv_engine()
+        service_engine = self.__get_service_engine()
         with service_engine.connect() as conn:
-            query = f"SELECT version FROM \"{config.service_schema}\".\"{config.migration_table}\""
-            if not config.legacy_sqlalchemy:
-                query = text(query)
-
+            query, _ = self.__get_version_queries()
             result = conn.execute(query)
             row = result.fetchone()
             curr_ver = row[0]
@@ -320,26 +484,41 @@ class MiGreat:
                 logger.error("Migration version in database exceeds that of the migration scripts")
                 sys.exit(1)
 
-        next_version = curr_ver + 1
-        for script in scripts[curr_ver:]:
-            spec = importlib.util.spec_from_file_location(
-                script[:-3],
-                os.path.join(
-                    MiGreat.SCRIPTS_DIR,
-                    script,
-                ),
-            )
-            module = importlib.util.module_from_spec(spec)
-            spec.loader.exec_module(module)
-
+        # Import migrators through the regular import machinery so bytecode cached under
+        # __pycache__ is reused across invocations instead of recompiling each script
+        if MiGreat.SCRIPTS_DIR not in sys.path:
+            sys.path.insert(0, MiGreat.SCRIPTS_DIR)
+
+        # Load and validate every pending migrator before any of them run, so a module
+        # missing its upgrade/downgrade methods is caught before the first migration is
+        # applied and the transaction loop below only does database work.  Imports are
+        # fanned out across a small thread pool; executor.map preserves script order.
+        pending_scripts = scripts[curr_ver:]
+        pending = []
+        modules = []
+        if pending_scripts:
+            from concurrent.futures import ThreadPoolExecutor
+
+            with ThreadPoolExecutor(max_workers=min(8, len(pending_scripts))) as executor:
+                modules = list(executor.map(
+                    importlib.import_module,
+                    [script[:-3] for script in pending_scripts],
+                ))
+
+        for script, module in zip(pending_scripts, modules):
             if not hasattr(module, 'upgrade'):
-                logger.error(f"Migrator {script} does not have an upgrade method")
+                logger.error("Migrator %s does not have an upgrade method", script)
                 sys.exit(1)
 
             if not hasattr(module, 'downgrade'):
-                logger.error(f"Migrator {script} does not have a downgrade method")
+                logger.error("Migrator %s does not have a downgrade method", script)
                 sys.exit(1)
 
+            pending.append(module)
+
+        next_version = curr_ver + 1
+        deferred_version = None
+        for module in pending:
             if hasattr(module, 'CONFIG_OPTIONS'):
                 CONFIG_OPTIONS = module.CONFIG_OPTIONS
             else:
@@ -349,80 +528,109 @@ class MiGreat:
             run_as_priv = CONFIG_OPTIONS.get('run_as_priv', False)
 
             engine = priv_engine if run_as_priv else service_engine
-            session = Session(engine, future=not config.legacy_sqlalchemy)
+            session = Session(engine)
 
-            logger.info(f"Migrating {next_version - 1} to {next_version}")
+            logger.info("Migrating %s to %s", next_version - 1, next_version)
             try:
                 if transact:
                     with session.begin():
                         module.upgrade(session)
                         self.__update_version(session, next_version)
+                    deferred_version = None
+                elif CONFIG_OPTIONS.get('coalesce_version', False):
+                    # Defer the version bump so a run of consecutive non-transacted
+                    # migrators commits a single UPDATE instead of one each
+                    module.upgrade(session)
+                    deferred_version = next_version
                 else:
                     module.upgrade(session)
                     with session.begin():
                         self.__update_version(session, next_version)
+                    deferred_version = None
             except:
                 logger.error("Migration failed", exc_info=1)
                 sys.exit(1)
 
             next_version += 1
 
+        if deferred_version is not None:
+            session = Session(service_engine)
+            with session.begin():
+                self.__update_version(session, deferred_version)
+
     def __update_version(self, conn, next_version: int):
         """
             Updates the schema version.
         """
-        config = self.config
-        # This is fully qualified in case the privileged user has been selected to perform
-        # the operation.
-        query = f"""
-            UPDATE \"{config.service_schema}\".\"{config.migration_table}\"
-            SET version = :next_version
-        """
-        if not self.config.legacy_sqlalchemy:
-            query = text(query)
+        _, query = self.__get_version_queries()
 
-        conn.execute(
+        # RETURNING hands the applied version back on the same round-trip, so callers can
+        # confirm the bump without a follow-up SELECT
+        result = conn.execute(
             query, {
                 "next_version": next_version
             }
         )
+        return result.scalar()
 
     def __validate_migrator_scripts(self) -> int:
         """
-            Validates and returns information about the current migrator scripts.
+            Validates and returns information about the current migrator scripts.  The result
+            is cached on the instance so repeat callers don't re-scan the directory.
         """
+        if self.__migrator_scripts is not None:
+            return self.__migrator_scripts
+
         highest_version = 0
         scripts_by_version = {}
         scripts = []
-        existing_scripts = glob(os.path.join(MiGreat.SCRIPTS_DIR, "*.py"))
-        for full_path in sorted(existing_scripts):
-            _, filename = os.path.split(full_path)
-            match = MiGreat.__SCRIPT_MATCHER.match(filename)
-            if match is not None:
-                ver = int(match.groups()[0])
-                if ver in scripts_by_version:
-                    logger.error(f"Multiple migrators share version number {ver}")
-                    sys.exit(1)
-                scripts_by_version[ver] = filename
-                highest_version = max(highest_version, ver)
-
-        # Make sure there are no holes in the scripts:
+        with os.scandir(MiGreat.SCRIPTS_DIR) as entries:
+            existing_scripts = [
+                entry.name for entry in entries
+                if entry.name.endswith(".py") and entry.is_file()
+            ]
+        # No need to sort; ordering falls out of the version-keyed dict when the series is
+        # replayed below
+        for filename in existing_scripts:
+            # Active migrators have the shape <digits>_<stem>.py with a non-empty, dot-free
+            # stem, enforced with cheap string ops instead of a regex.  scandir already
+            # guaranteed the .py suffix.
+            prefix, sep, remainder = filename.partition("_")
+            stem = remainder[:-3]
+            if not (sep and prefix.isdigit() and stem and "." not in stem):
+                continue
+            ver = int(prefix)
+            if ver in scripts_by_version:
+                logger.error("Multiple migrators share version number %s", ver)
+                sys.exit(1)
+            scripts_by_version[ver] = filename
+            highest_version = max(highest_version, ver)
+
+        # Make sure there are no holes in the scripts, reporting every missing version at
+        # once rather than bailing on the first
         if highest_version:
-            for ver in range(1, highest_version + 1):
-                if ver not in scripts_by_version:
-                    logger.error(f"Migrator {ver} is missing from the series")
-                    sys.exit(1)
-                scripts.append(scripts_by_version[ver])
+            missing = set(range(1, highest_version + 1)) - scripts_by_version.keys()
+            if missing:
+                logger.error(
+                    "Migrators missing from the series: %s",
+                    ", ".join(str(ver) for ver in sorted(missing)),
+                )
+                sys.exit(1)
+            scripts = [scripts_by_version[ver] for ver in range(1, highest_version + 1)]
 
-        return highest_version, scripts
+        self.__migrator_scripts = (highest_version, scripts)
+        return self.__migrator_scripts
 
-    def __concurrency_protection(self, engine, query, bindings={}):
+    def __concurrency_protection(self, engine, query, bindings={}, locked=False):
         """
             Certain first-time operations will create a concurrency violation within the database.
             These operations need to be handled in separate transactions, and have a degree of
-            retry-ability before failing.
+            retry-ability before failing.  Under an advisory lock no other replica can contend,
+            so the statement executes exactly once.
         """
-        failure_retries = 5
+        from sqlalchemy.exc import InternalError
+
+        failure_retries = 1 if locked else 5
         while failure_retries > 0:
             with engine.begin() as conn:
                 try:
@@ -431,49 +639,42 @@ class MiGreat:
                     else:
                         conn.execute(query)
                     return
-                except sqlalchemy.exc.InternalError as e:
+                except InternalError as e:
                     logger.info("Possible resource contention, retrying shortly.")
                     logger.debug(e)
                     failure_retries -= 1
                     if failure_retries == 0:
                         logger.error("Failed to prepare database", exc_info=1)
                         sys.exit(1)
-                    # Try to avoid collision by sleeping for a random time interval
-                    time.sleep(.5 + random.random())
+                    # Try to avoid collision by backing off exponentially with full jitter
+                    time.sleep(random.uniform(0, 2 ** (5 - failure_retries)))
 
-    def __check_and_remove_migraton_controls(self):
+    def __check_and_remove_migraton_controls(self, locked=False):
         """
             Checks to determine if MiGreat's migration controls have been removed from the target
             database, and removes them if they haven't been already.
         """
+        from sqlalchemy import text
+
         config = self.config
-        engine = MiGreat.connect(
-            self.config.hostname,
-            self.config.port,
-            self.config.database,
-            self.config.priv_db_username,
-            self.config.priv_db_password,
-            self.config.conn_retry_interval,
-            self.config.max_conn_retries,
-            False,
-            False,
-        )
+        engine = self.__get_priv_engine()
 
         if config.group is not None:
             with engine.begin() as conn:
-                result = conn.execute(text("""
-                    SELECT 1
-                    FROM pg_catalog.pg_roles cr
-                    JOIN pg_catalog.pg_auth_members m ON (m.member = cr.oid)
-                    JOIN pg_roles r ON (m.roleid = r.oid)
-                    WHERE
-                        cr.rolname = :username AND
-                        r.rolname = :group
+                is_group_member = conn.execute(text("""
+                    SELECT EXISTS (
+                        SELECT 1
+                        FROM pg_catalog.pg_roles cr
+                        JOIN pg_catalog.pg_auth_members m ON (m.member = cr.oid)
+                        JOIN pg_roles r ON (m.roleid = r.oid)
+                        WHERE
+                            cr.rolname = :username AND
+                            r.rolname = :group
+                    )
                 """), {
                     "username": config.service_db_username,
                     "group": config.group,
-                })
-                is_group_member = result.fetchone() is not None
+                }).scalar()
                 # Remove schema
 
             if is_group_member:
@@ -481,7 +682,8 @@ class MiGreat:
                     engine,
                     text(f"""
                         ALTER GROUP "{config.group}" DROP USER "{config.service_db_username}"
-                    """)
+                    """),
+                    locked=locked,
                 )
 
             with engine.begin() as conn:
@@ -491,6 +693,9 @@ class MiGreat:
                 """))
 
     def __connect_service_user(self, superuser_engine):
+        from sqlalchemy import text
+        from sqlalchemy.exc import OperationalError
+
         try:
             service_engine = MiGreat.connect(
                 self.config.hostname,
@@ -500,7 +705,6 @@ class MiGreat:
                 self.config.service_db_password,
                 self.config.conn_retry_interval,
                 1,
-                self.config.legacy_sqlalchemy,
                 True,
             )
             with service_engine.connect() as conn:
@@ -529,7 +733,6 @@ class MiGreat:
                 self.config.service_db_password,
                 self.config.conn_retry_interval,
                 1,
-                self.config.legacy_sqlalchemy,
                 False,
             )
             logger.info("Success")
@@ -542,62 +745,55 @@ class MiGreat:
                 self.config.service_db_password,
                 self.config.conn_retry_interval,
                 self.config.max_conn_retries,
-                self.config.legacy_sqlalchemy,
                 False,
             )
 
-    def __check_and_apply_migration_controls(self):
+    def __check_and_apply_migration_controls(self, locked=False):
         """
             Checks to determine if MiGreat's migration controls have been applied to the target
             database, and applies them if they have not already been applied.
         """
-        engine = MiGreat.connect(
-            self.config.hostname,
-            self.config.port,
-            self.config.database,
-            self.config.priv_db_username,
-            self.config.priv_db_password,
-            self.config.conn_retry_interval,
-            self.config.max_conn_retries,
-            False,
-            False,
-        )
+        from sqlalchemy import text
+
+        engine = self.__get_priv_engine()
 
         config = self.config
-        if config.group is not None:
-            # This block mitigates a race condition that can manifest as a failed transaction,
-            # when multiple different services attempt to create the non existant group for the
-            # first time.
-            try:
-                with engine.begin() as conn:
-                    # Check if group exists
-                    result = conn.execute(
-                        text("""
-                            SELECT 1 FROM pg_roles WHERE rolname = :group
-                        """),
-                        {
-                            "group": config.group,
-                        }
+        with engine.begin() as conn:
+            # Probe for the user, schema, tracking table, group and group membership in a
+            # single round-trip rather than one query each.  In the steady state everything
+            # already exists and this one query is all the bootstrap costs.
+            result = conn.execute(text("""
+                SELECT
+                    EXISTS (
+                        SELECT 1 FROM pg_roles WHERE rolname = :username
+                    ),
+                    EXISTS (
+                        SELECT 1 FROM information_schema.schemata WHERE schema_name = :schema
+                    ),
+                    to_regclass(:qualified_table) IS NOT NULL,
+                    EXISTS (
+                        SELECT 1 FROM pg_roles WHERE rolname = :group
+                    ),
+                    EXISTS (
+                        SELECT 1
+                        FROM pg_catalog.pg_roles cr
+                        JOIN pg_catalog.pg_auth_members m ON (m.member = cr.oid)
+                        JOIN pg_roles r ON (m.roleid = r.oid)
+                        WHERE
+                            cr.rolname = :username AND
+                            r.rolname = :group
                     )
-                    row = result.fetchone()
-                    if row is None:
-                        conn.execute(
-                            text(f"CREATE GROUP \"{config.group}\"")
-                        )
-            except:
-                logger.info("Continuing... group probably created in parallel")
+            """), {
+                "username": config.service_db_username,
+                "schema": config.service_schema,
+                "qualified_table": f'"{config.service_schema}"."{config.migration_table}"',
+                "group": config.group or "",
+            })
+            user_exists, schema_exists, table_exists, group_exists, is_group_member = \
+                result.fetchone()
 
-        with engine.begin() as conn:
-            # Check if the service user exists
-            result = conn.execute(
-                text("SELECT 1 FROM pg_roles WHERE rolname=:username"),
-                {
-                    "username": config.service_db_username,
-                }
-            )
-            row = result.fetchone()
-            if row is None:
-                logger.info(f'Creating user "{config.service_db_username}"')
+            if not user_exists:
+                logger.info('Creating user "%s"', config.service_db_username)
                 conn.execute(
                     text(
                         f"CREATE USER \"{config.service_db_username}\" WITH ENCRYPTED PASSWORD :password"
@@ -606,57 +802,31 @@ class MiGreat:
                     }
                 )
 
-            # Check if the service schema exists
-            result = conn.execute(
-                text("""
-                    SELECT schema_name FROM information_schema.schemata WHERE schema_name = :schema
-                """), {
-                    "schema": config.service_schema
-                }
-            )
-            row = result.fetchone()
-            if row is None:
-                logger.info(f'Creating schema "{config.service_schema}"')
-                conn.execute(text(f"CREATE SCHEMA \"{config.service_schema}\""))
-
+            if not schema_exists:
+                logger.info('Creating schema "%s"', config.service_schema)
+                # Ship the schema creation and its grants as one multi-statement execution
                 conn.execute(text(f"""
+                    CREATE SCHEMA \"{config.service_schema}\";
+
                     GRANT ALL PRIVILEGES ON SCHEMA \"{config.service_schema}\"
-                    TO \"{config.service_db_username}\"
-                """))
+                    TO \"{config.service_db_username}\";
 
-                conn.execute(text(f"""
                     GRANT ALL PRIVILEGES ON ALL TABLES IN SCHEMA \"{config.service_schema}\"
-                    TO \"{config.service_db_username}\"
-                """))
+                    TO \"{config.service_db_username}\";
 
-                conn.execute(text(f"""
                     ALTER ROLE \"{config.service_db_username}\" SET search_path
-                    TO \"{config.service_schema}\", PUBLIC
+                    TO \"{config.service_schema}\", PUBLIC;
                 """))
 
-            # Check if migration tracking table exists
-            result = conn.execute(text("""
-                SELECT FROM pg_catalog.pg_class cat
-                JOIN pg_catalog.pg_namespace ns ON ns.oid = cat.relnamespace
-                WHERE
-                    ns.nspname = :service_schema AND
-                    cat.relname = :migration_table AND
-                    cat.relkind = 'r'
-            """), {
-                "service_schema": config.service_schema,
-                "migration_table": config.migration_table,
-            })
-            row = result.fetchone()
-            if row is None:
+            if not table_exists:
+                # Likewise for the tracking table, its seed row and grant
                 conn.execute(text(f"""
                     CREATE TABLE \"{config.service_schema}\".\"{config.migration_table}\" (
                         repository_id TEXT NOT NULL,
                         repository_path TEXT NOT NULL,
                         version INT NOT NULL
                     );
-                """))
 
-                conn.execute(text(f"""
                     INSERT INTO \"{config.service_schema}\".\"{config.migration_table}\" (
                         repository_id,
                         repository_path,
@@ -665,33 +835,27 @@ class MiGreat:
                         :service_schema,
                         :migrator_dir,
                         :version
-                    )
+                    );
+
+                    GRANT ALL PRIVILEGES ON TABLE \"{config.service_schema}\".\"{config.migration_table}\"
+                    TO \"{config.service_db_username}\";
                 """),  {
                     "service_schema": config.service_schema,
                     "migrator_dir": MiGreat.SCRIPTS_DIR,
                     "version": 0,
                 })
 
-                conn.execute(text(f"""
-                    GRANT ALL PRIVILEGES ON TABLE \"{config.service_schema}\".\"{config.migration_table}\"
-                    TO \"{config.service_db_username}\"
-                """))
-
-            if config.group is not None:
-                result = conn.execute(text("""
-                    SELECT 1
-                    FROM pg_catalog.pg_roles cr
-                    JOIN pg_catalog.pg_auth_members m ON (m.member = cr.oid)
-                    JOIN pg_roles r ON (m.roleid = r.oid)
-                    WHERE
-                        cr.rolname = :username AND
-                        r.rolname = :group
-                """), {
-                    "username": config.service_db_username,
-                    "group": config.group,
-                })
-                is_group_member = result.fetchone() is not None
-
+        if config.group is not None and not group_exists:
+            # This block mitigates a race condition that can manifest as a failed transaction,
+            # when multiple different services attempt to create the non existant group for the
+            # first time.
+            try:
+                with engine.begin() as conn:
+                    conn.execute(
+                        text(f"CREATE GROUP \"{config.group}\"")
+                    )
+            except:
+                logger.info("Continuing... group probably created in parallel")
 
         if config.group is not None and not is_group_member:
             # This can easily happen at the same time in multiple services that are migrating
@@ -701,11 +865,7 @@ class MiGreat:
                 text(f"""
                     ALTER GROUP \"{config.group}\" ADD USER \"{config.service_db_username}\";
                     GRANT USAGE ON SCHEMA \"{config.service_schema}\" TO GROUP \"{config.group}\";
-                """)
+                """),
+                locked=locked,
             )
 
-    __SCRIPT_MATCHER = re.compile("^(\d+)_.+.py$")
-    """ Regular expression to match active migrator scripts """
-
-    __VAR_SUBST_MATCHER = re.compile("^\$\{(.+)\}$")
-    """ Regular expression to perform environment variable injection """